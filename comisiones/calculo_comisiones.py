@@ -0,0 +1,136 @@
+import re
+import numpy as np
+import pandas as pd
+from conexion_mysql import crear_conexion
+
+# ======================================================
+# === OBL DIGITAL — Cálculo de comisiones FTD (vectorizado)
+# ======================================================
+
+CSV_RESPALDO = "CMN_MASTER_MEX_preview.csv"
+
+# Tramos de comisión progresiva: ftd_num máximo del tramo -> porcentaje
+TRAMOS_COMISION = [(3, 0.10), (7, 0.17), (12, 0.19), (17, 0.22), (21, 0.25)]
+PCT_TRAMO_FINAL = 0.30
+
+# Bonus semanal (MXN): FTDs mínimos en la semana -> bonus (se evalúa en orden)
+TRAMOS_BONUS = [(15, 150), (5, 1500), (4, 1000), (2, 500)]
+
+COLUMNAS_DETALLE = ["date", "agent", "team", "country", "affiliate", "usd", "ftd_num", "comm_pct", "commission_usd"]
+
+
+# =====================
+# CARGA DATOS
+# =====================
+def cargar_datos(csv_respaldo=CSV_RESPALDO):
+    """Lee CMN_MASTER_MEX_CLEAN de Railway; si falla, usa el CSV de respaldo."""
+    try:
+        conexion = crear_conexion()
+        if conexion:
+            df = pd.read_sql("SELECT * FROM CMN_MASTER_MEX_CLEAN", conexion)
+            conexion.close()
+            return df
+    except Exception as e:
+        print(f"⚠️ Error SQL, usando CSV: {e}")
+    return pd.read_csv(csv_respaldo, dtype=str)
+
+
+# =====================
+# LIMPIEZA
+# =====================
+def convertir_fechas(serie):
+    """Convierte una serie de fechas (dd/mm/YYYY o ISO) a datetime sin zona."""
+    texto = serie.astype(str)
+    con_barra = texto.str.contains("/", regex=False)
+    fechas = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+    fechas[con_barra] = _sin_zona(pd.to_datetime(texto[con_barra], format="%d/%m/%Y", errors="coerce"))
+    # format="mixed": cada valor se interpreta por separado (no se infiere un formato único)
+    fechas[~con_barra] = _sin_zona(
+        pd.to_datetime(texto[~con_barra].str.split(" ").str[0], format="mixed", errors="coerce")
+    )
+    return fechas
+
+
+def _sin_zona(fechas):
+    if getattr(fechas.dt, "tz", None) is not None:
+        return fechas.dt.tz_localize(None)
+    return fechas
+
+
+def limpiar_usd(valor):
+    """Convierte texto/moneda a float (0.0 si no es interpretable)."""
+    if pd.isna(valor):
+        return 0.0
+    s = re.sub(r"[^\d,.\-]", "", str(valor))
+    if "." in s and "," in s:
+        s = s.replace(",", "") if s.rfind(".") > s.rfind(",") else s.replace(".", "").replace(",", ".")
+    elif "," in s and "." not in s:
+        s = s.replace(",", ".") if len(s.split(",")[-1]) == 2 else s.replace(",", "")
+    try:
+        return float(s)
+    except:
+        return 0.0
+
+
+def preparar_ftd(df):
+    """Filtra FTD, normaliza fechas/USD/texto y calcula ftd_num, comm_pct y commission_usd."""
+    df = df.copy()
+    df.columns = [c.strip().lower() for c in df.columns]
+
+    if "type" not in df.columns:
+        df["type"] = "FTD"
+    df = df[df["type"].astype(str).str.upper() == "FTD"].copy()
+
+    df["date"] = convertir_fechas(df["date"])
+    df = df[df["date"].notna()].copy()
+
+    # Muchos montos se repiten: se limpia cada valor distinto una sola vez
+    unicos = df["usd"].drop_duplicates()
+    df["usd"] = df["usd"].map(dict(zip(unicos, unicos.map(limpiar_usd)))).fillna(0.0)
+    df["usd_neto"] = df["usd"]
+
+    for col in ["agent", "team", "country", "affiliate"]:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.strip().str.title()
+            df[col] = df[col].replace({"Nan": None, "None": None, "": None})
+
+    df = df.sort_values(["agent", "date"]).reset_index(drop=True)
+    df["_ym"] = df["date"].dt.to_period("M")   # interno
+    df["ftd_num"] = df.groupby(["agent", "_ym"]).cumcount() + 1
+    df["comm_pct"] = porcentaje_tramo_progresivo(df["ftd_num"])
+    df["commission_usd"] = df["usd_neto"] * df["comm_pct"]
+    return df
+
+
+# =====================
+# COMISIÓN / BONUS
+# =====================
+def porcentaje_tramo_progresivo(ftd_num):
+    """Porcentaje de comisión para una serie de ftd_num (tramos acumulados en el mes)."""
+    n = np.asarray(ftd_num)
+    condiciones = [n <= tope for tope, _ in TRAMOS_COMISION]
+    porcentajes = [pct for _, pct in TRAMOS_COMISION]
+    return np.select(condiciones, porcentajes, default=PCT_TRAMO_FINAL)
+
+
+def semana_del_mes(fechas):
+    """Semana del mes (1..6) tomando como inicio el día de la semana del día 1."""
+    dia = fechas.dt.day
+    weekday_dia_1 = (fechas.dt.weekday - (dia - 1)) % 7
+    return (dia + weekday_dia_1 - 1) // 7 + 1
+
+
+def bonus_semanal_por_agente(dff):
+    """Bonus semanal (MXN) sumado por agente."""
+    if dff.empty:
+        return pd.Series(dtype=float, name="bonus_mxn")
+    semanas = dff.assign(
+        year=dff["date"].dt.year,
+        month=dff["date"].dt.month,
+        week=semana_del_mes(dff["date"]),
+    )
+    conteo = semanas.groupby(["agent", "year", "month", "week"]).size().reset_index(name="ftds")
+    condiciones = [conteo["ftds"] >= minimo for minimo, _ in TRAMOS_BONUS]
+    montos = [monto for _, monto in TRAMOS_BONUS]
+    conteo["bonus_mxn"] = np.select(condiciones, montos, default=0).astype(float)
+    return conteo.groupby("agent")["bonus_mxn"].sum()
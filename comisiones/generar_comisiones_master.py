@@ -1,6 +1,9 @@
+import argparse
+import difflib
 import pandas as pd
 import re
 from conexion_mysql import crear_conexion
+from calculo_comisiones import convertir_fechas
 
 # ======================================================
 # === OBL DIGITAL — Generador CMN_MASTER_MEX_CLEAN (FTD + RTN)
@@ -116,6 +119,122 @@ def construir_df_limpio(df, month_label, tipo):
     return df_limpio
 
 
+# ======================================================
+# === DEDUP + CALIDAD
+# ======================================================
+CAMPOS_HASH = ["id", "date", "agent", "usd", "type"]
+COLUMNAS_MASTER = ["date", "id", "team", "agent", "country", "affiliate", "source", "usd", "month_name", "type"]
+
+
+def claves_filas(df):
+    """Campos clave normalizados + ordinal de ocurrencia de esa clave dentro de su tabla de origen."""
+    # Fecha canónica YYYY-MM-DD ("2025-10-11" y "2025-10-11 00:00:00" son la misma);
+    # si no se puede interpretar se conserva el texto original
+    fecha_texto = df["date"].fillna("").astype(str).str.strip()
+    fechas = convertir_fechas(df["date"])
+    fecha = fechas.dt.strftime("%Y-%m-%d").where(fechas.notna(), fecha_texto)
+    # "123.0" (id leído como float) -> "123"
+    id_texto = df["id"].fillna("").astype(str).str.strip().str.replace(r"^(\d+)\.0+$", r"\1", regex=True)
+
+    claves = pd.DataFrame({
+        "id": id_texto,
+        "date": fecha,
+        "agent": df["agent"].fillna("").astype(str).str.strip().str.lower(),
+        "usd": pd.to_numeric(df["usd"], errors="coerce").round(2).astype(str),
+        "type": df["type"].fillna("").astype(str).str.upper(),
+    }, index=df.index)
+    # Depósitos repetidos legítimos (mismo id/día/monto) en una tabla tienen ordinal distinto;
+    # la k-ésima ocurrencia en otra tabla sí cuenta como duplicado entre tablas.
+    claves["ocurrencia"] = claves.assign(_tabla=df["_tabla"]).groupby(["_tabla"] + CAMPOS_HASH).cumcount()
+    claves["vacia"] = (claves[["id", "date", "agent"]] == "").all(axis=1) & (claves["usd"] == "nan")
+    return claves
+
+
+def calcular_hash_filas(claves):
+    """Hash uint64 (como texto) de clave + ocurrencia; None si todos los campos clave están vacíos."""
+    hashes = pd.util.hash_pandas_object(claves[CAMPOS_HASH + ["ocurrencia"]], index=False).astype(str)
+    return hashes.where(~claves["vacia"], None)
+
+
+def deduplicar(df_master, hashes_vistos=None):
+    """Quita duplicados entre tablas y, si se pasan, filas ya cargadas antes.
+
+    Devuelve (filas_nuevas, stats, no_cargadas): no_cargadas es el frame antes del dedup
+    sin las filas ya cargadas, para el reporte de calidad.
+    """
+    df_master = df_master.copy()
+    claves = claves_filas(df_master)
+    df_master["row_hash"] = calcular_hash_filas(claves).values
+
+    con_hash = df_master["row_hash"].notna()
+    duplicada = con_hash & df_master["row_hash"].duplicated()
+    if hashes_vistos is not None:
+        ya_vista = con_hash & df_master["row_hash"].isin(hashes_vistos)
+        # Sin clave no se puede saber si ya se cargó: en incremental se omiten
+        sin_clave_omitida = ~con_hash
+    else:
+        ya_vista = pd.Series(False, index=df_master.index)
+        sin_clave_omitida = pd.Series(False, index=df_master.index)
+
+    stats = {
+        "duplicados_entre_tablas": int(duplicada.sum()),
+        "ya_cargados": int((ya_vista & ~duplicada).sum()),
+        "repetidos_en_tabla": int(((claves["ocurrencia"] > 0) & con_hash).sum()),
+        "sin_clave": int((~con_hash).sum()),
+        "sin_clave_omitidos": int(sin_clave_omitida.sum()),
+    }
+    nuevas = df_master[~duplicada & ~ya_vista & ~sin_clave_omitida].reset_index(drop=True)
+    no_cargadas = df_master[~ya_vista].reset_index(drop=True)
+    return nuevas, stats, no_cargadas
+
+
+def agentes_sospechosos(agentes, cutoff=0.92):
+    """{nombre: nombre_probable} para agentes escritos casi igual que otro más frecuente
+    (ej. "Ashley Villlaba" -> "Ashley Villalba"). No hay padrón de agentes: es una heurística."""
+    conteo = agentes.dropna().astype(str).str.strip().str.title()
+    conteo = conteo[~conteo.isin(["", "Nan", "None"])].value_counts()
+    nombres = list(conteo.index)   # de más a menos frecuente
+    sospechosos = {}
+    for i, nombre in enumerate(nombres):
+        parecido = difflib.get_close_matches(nombre, nombres[:i], n=1, cutoff=cutoff)
+        if parecido:
+            sospechosos[nombre] = parecido[0]
+    return sospechosos
+
+
+def reporte_calidad(df_master, sospechosos=None):
+    """Conteo de montos inválidos, fechas no interpretables, agentes vacíos y agentes
+    con nombre sospechoso (posible error de escritura) por mes/tipo."""
+    if sospechosos is None:
+        sospechosos = agentes_sospechosos(df_master["agent"])
+    agente = df_master["agent"].astype(str).str.strip().str.title()
+    usd = pd.to_numeric(df_master["usd"], errors="coerce")
+    problemas = pd.DataFrame({
+        "month_name": df_master["month_name"],
+        "type": df_master["type"],
+        "filas": 1,
+        "monto_invalido": usd.isna() | (usd <= 0),
+        "fecha_invalida": convertir_fechas(df_master["date"]).isna(),
+        "agente_vacio": df_master["agent"].isna() | agente.isin(["", "Nan", "None"]),
+        "agente_sospechoso": agente.isin(list(sospechosos)),
+    })
+    return problemas.groupby(["month_name", "type"], as_index=False).sum()
+
+
+def leer_hashes_existentes(conexion):
+    """Hashes ya presentes en CMN_MASTER_MEX_CLEAN (None si la tabla no existe o no tiene row_hash)."""
+    try:
+        cursor = conexion.cursor()
+        cursor.execute("SELECT row_hash FROM CMN_MASTER_MEX_CLEAN")
+        hashes = {fila[0] for fila in cursor.fetchall()}
+        hashes.discard(None)   # filas sin clave (row_hash NULL)
+        cursor.close()
+        return hashes
+    except Exception as e:
+        print(f"⚠️ No se pudieron leer hashes previos ({e}); se hará carga completa.")
+        return None
+
+
 def cargar_tabla(tabla, conexion):
     """Lee, limpia y devuelve un DF estandarizado."""
     print(f"\n===> Leyendo tabla {tabla} ...")
@@ -138,7 +257,7 @@ def cargar_tabla(tabla, conexion):
     return df_limpio
 
 
-def obtener_datos():
+def obtener_datos(incremental=False):
     conexion = crear_conexion()
     if conexion is None:
         print("❌ No se pudo conectar a Railway.")
@@ -157,11 +276,14 @@ def obtener_datos():
     for tabla in tablas:
         try:
             df_mes = cargar_tabla(tabla, conexion)
+            df_mes["_tabla"] = tabla   # interno
             if not df_mes.empty:
                 dataframes.append(df_mes)
         except Exception as e:
             print(f"⚠️ Error procesando {tabla}: {e}")
 
+    hashes_vistos = leer_hashes_existentes(conexion) if incremental else None
+    incremental = hashes_vistos is not None
     conexion.close()
 
     if not dataframes:
@@ -169,51 +291,83 @@ def obtener_datos():
         return pd.DataFrame()
 
     df_master = pd.concat(dataframes, ignore_index=True)
+    total_bruto = len(df_master)
+    df_master, stats, no_cargadas = deduplicar(df_master, hashes_vistos)
+    print(f"\n🧹 Dedup: {total_bruto} filas -> {len(df_master)} "
+          f"({stats['duplicados_entre_tablas']} duplicadas entre tablas, {stats['ya_cargados']} ya cargadas)")
+    print(f"   🔸 {stats['repetidos_en_tabla']} filas repiten clave dentro de su tabla (se conservan como depósitos distintos)")
+    if stats["sin_clave"]:
+        omitidas = f", {stats['sin_clave_omitidos']} omitidas en incremental" if incremental else ""
+        print(f"   🔸 {stats['sin_clave']} filas sin campos clave (sin hash{omitidas})")
+
+    # Antes del dedup, para no colapsar las filas malas; en incremental solo filas no cargadas aún
+    sospechosos = agentes_sospechosos(no_cargadas["agent"])
+    calidad = reporte_calidad(no_cargadas, sospechosos)
+    calidad.insert(0, "alcance", "solo_filas_nuevas" if incremental else "todas")
+    if incremental:
+        print("🔎 Reporte de calidad (incremental: solo filas nuevas, aún no cargadas):")
+    else:
+        print("🔎 Reporte de calidad (todas las filas leídas):")
+    print(calidad.to_string(index=False))
+    for nombre, probable in sospechosos.items():
+        print(f"   ⚠️ Agente sospechoso: '{nombre}' (¿'{probable}'?)")
+    calidad.to_csv("CMN_MASTER_MEX_calidad.csv", index=False, encoding="utf-8-sig")
+
     print(f"\n📊 CMN_MASTER_MEX generado correctamente con {len(df_master)} registros totales.")
     print(df_master["month_name"].value_counts())
 
-    df_master.to_csv("CMN_MASTER_MEX_preview.csv", index=False, encoding="utf-8-sig")
-    print("💾 Vista previa guardada: CMN_MASTER_MEX_preview.csv")
+    # En incremental solo hay filas nuevas: no se pisa la vista previa completa
+    if not incremental:
+        df_master.drop(columns=["row_hash", "_tabla"]).to_csv("CMN_MASTER_MEX_preview.csv", index=False, encoding="utf-8-sig")
+        print("💾 Vista previa guardada: CMN_MASTER_MEX_preview.csv")
 
-    # Crear tabla en Railway
+    # Crear / actualizar tabla en Railway
     try:
         conexion = crear_conexion()
         if conexion:
             cursor = conexion.cursor()
-            cursor.execute("DROP TABLE IF EXISTS CMN_MASTER_MEX_CLEAN;")
-            cursor.execute("""
-                CREATE TABLE CMN_MASTER_MEX_CLEAN (
-                    date TEXT,
-                    id TEXT,
-                    team TEXT,
-                    agent TEXT,
-                    country TEXT,
-                    affiliate TEXT,
-                    source TEXT,
-                    usd TEXT,
-                    month_name TEXT,
-                    type TEXT
-                );
-            """)
-            conexion.commit()
-
-            columnas = ["date", "id", "team", "agent", "country", "affiliate", "source", "usd", "month_name", "type"]
-            for _, row in df_master.iterrows():
-                valores = [row.get(c) if row.get(c) is not None else None for c in columnas]
-                cursor.execute(
-                    f"INSERT INTO CMN_MASTER_MEX_CLEAN ({', '.join(columnas)}) VALUES ({', '.join(['%s'] * len(columnas))})",
-                    valores
-                )
+            if not incremental:
+                cursor.execute("DROP TABLE IF EXISTS CMN_MASTER_MEX_CLEAN;")
+                cursor.execute("""
+                    CREATE TABLE CMN_MASTER_MEX_CLEAN (
+                        date TEXT,
+                        id TEXT,
+                        team TEXT,
+                        agent TEXT,
+                        country TEXT,
+                        affiliate TEXT,
+                        source TEXT,
+                        usd TEXT,
+                        month_name TEXT,
+                        type TEXT,
+                        row_hash VARCHAR(20),
+                        UNIQUE KEY ux_row_hash (row_hash)
+                    );
+                """)
+                conexion.commit()
+
+            columnas = COLUMNAS_MASTER + ["row_hash"]
+            valores = df_master[columnas].astype(object).where(df_master[columnas].notna(), None).values.tolist()
+            cursor.executemany(
+                f"INSERT INTO CMN_MASTER_MEX_CLEAN ({', '.join(columnas)}) VALUES ({', '.join(['%s'] * len(columnas))})",
+                valores
+            )
             conexion.commit()
             conexion.close()
-            print("✅ CMN_MASTER_MEX_CLEAN creada y poblada correctamente en Railway (con TYPE).")
+            modo = "actualizada (incremental)" if incremental else "creada y poblada"
+            print(f"✅ CMN_MASTER_MEX_CLEAN {modo} correctamente en Railway: {len(valores)} filas nuevas.")
     except Exception as e:
         print(f"⚠️ Error al crear CMN_MASTER_MEX_CLEAN: {e}")
 
-    return df_master
+    return df_master.drop(columns="_tabla")
 
 
 if __name__ == "__main__":
-    df = obtener_datos()
+    parser = argparse.ArgumentParser(description="Genera CMN_MASTER_MEX_CLEAN (FTD + RTN) en Railway.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Conserva CMN_MASTER_MEX_CLEAN e inserta solo filas con hash nuevo")
+    args = parser.parse_args()
+
+    df = obtener_datos(incremental=args.incremental)
     print("\nPrimeras filas de CMN_MASTER_MEX:")
     print(df.head())
@@ -0,0 +1,186 @@
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from calculo_comisiones import (
+    COLUMNAS_DETALLE,
+    CSV_RESPALDO,
+    bonus_semanal_por_agente,
+    cargar_datos,
+    preparar_ftd,
+)
+
+# ======================================================
+# === OBL DIGITAL — Estados de comisiones mensuales por agente
+# ======================================================
+# Uso:
+#   python generar_estados_comisiones.py 2025-10
+#   python generar_estados_comisiones.py 2025-10 --modo libro --salida estados
+#   python generar_estados_comisiones.py 2025-10 --csv CMN_MASTER_MEX_preview.csv --workers 4
+
+
+def mes_valido(valor):
+    """Tipo argparse: acepta YYYY-MM con mes 01..12."""
+    m = re.fullmatch(r"(\d{4})-(\d{2})", valor.strip())
+    if not m or not 1 <= int(m.group(2)) <= 12:
+        raise argparse.ArgumentTypeError(f"mes inválido '{valor}', use YYYY-MM (ej. 2025-10)")
+    return f"{m.group(1)}-{m.group(2)}"
+
+
+def entero_positivo(valor):
+    """Tipo argparse: entero >= 1."""
+    try:
+        n = int(valor)
+    except ValueError:
+        n = 0
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"valor inválido '{valor}', debe ser un entero >= 1")
+    return n
+
+
+def calcular_estados(df, mes):
+    """Filtra el mes (YYYY-MM) y devuelve (detalle, indice) para todos los agentes."""
+    periodo = pd.Period(mes, freq="M")
+    dff = df[(df["_ym"] == periodo) & df["agent"].notna()].copy()
+
+    bonus = bonus_semanal_por_agente(dff)
+    indice = dff.groupby("agent").agg(
+        total_ftd=("ftd_num", "size"),
+        ventas_usd=("usd_neto", "sum"),
+        comision_usd=("commission_usd", "sum"),
+        pct_max=("comm_pct", "max"),
+    )
+    indice["bonus_mxn"] = bonus.reindex(indice.index).fillna(0.0)
+    indice = indice.reset_index()
+    indice[["ventas_usd", "comision_usd", "bonus_mxn"]] = indice[["ventas_usd", "comision_usd", "bonus_mxn"]].round(2)
+    return dff, indice
+
+
+def resumen_agente(fila):
+    """Hoja Resumen con las mismas métricas que el export del dashboard."""
+    return pd.DataFrame({
+        "Metrica": [
+            "PORCENTAJE COMISIÓN",
+            "VENTAS USD",
+            "BONUS SEMANAL MXN",
+            "COMISIÓN USD BY FTD",
+            "TOTAL VENTAS (FTDs)"
+        ],
+        "Valor": [
+            f"{fila['pct_max']*100:.2f}%",
+            fila["ventas_usd"],
+            fila["bonus_mxn"],
+            fila["comision_usd"],
+            int(fila["total_ftd"])
+        ]
+    })
+
+
+def detalle_agente(detalle):
+    detalle = detalle[COLUMNAS_DETALLE].copy()
+    detalle["comm_pct"] = detalle["comm_pct"] * 100
+    return detalle
+
+
+def nombre_archivo(agente, usados):
+    """Nombre de archivo seguro y único (dos agentes pueden normalizar igual)."""
+    base = re.sub(r"[^\w\-]+", "_", agente).strip("_") or "sin_nombre"
+    nombre, n = base, 2
+    while nombre.lower() in usados:
+        nombre = f"{base}_{n}"
+        n += 1
+    usados.add(nombre.lower())
+    return nombre
+
+
+def nombre_hoja(agente, usados):
+    """Nombre de hoja Excel válido (<=31 caracteres, sin []:*?/\\) y único."""
+    base = re.sub(r"[\[\]:*?/\\]", "", agente)[:31] or "Agente"
+    nombre, n = base, 2
+    while nombre.lower() in usados:
+        sufijo = f" ({n})"
+        nombre = base[:31 - len(sufijo)] + sufijo
+        n += 1
+    usados.add(nombre.lower())
+    return nombre
+
+
+def escribir_libro_agente(tarea):
+    """Worker del pool: escribe el libro Resumen/Detalle de un agente."""
+    ruta, resumen, detalle = tarea
+    with pd.ExcelWriter(ruta, engine="xlsxwriter") as writer:
+        resumen.to_excel(writer, sheet_name="Resumen", index=False)
+        detalle.to_excel(writer, sheet_name="Detalle", index=False)
+    return ruta
+
+
+def escribir_por_agente(dff, indice, mes, salida, workers):
+    """Un libro por agente, escritos en paralelo con un pool de procesos."""
+    grupos = dict(tuple(dff.groupby("agent")))
+    tareas, archivos, usados = [], [], set()
+    for _, fila in indice.iterrows():
+        ruta = os.path.join(salida, f"comisiones_{mes}_{nombre_archivo(fila['agent'], usados)}.xlsx")
+        tareas.append((ruta, resumen_agente(fila), detalle_agente(grupos[fila["agent"]])))
+        archivos.append(os.path.basename(ruta))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(escribir_libro_agente, tareas, chunksize=8))
+
+    indice["archivo"] = archivos
+    return indice
+
+
+def escribir_libro_unico(dff, indice, mes, salida):
+    """Un solo libro: hoja Indice + una hoja de detalle por agente."""
+    ruta = os.path.join(salida, f"comisiones_{mes}.xlsx")
+    grupos = dict(tuple(dff.groupby("agent")))
+    usados = {"indice"}
+    hojas = [nombre_hoja(a, usados) for a in indice["agent"]]
+    indice["hoja"] = hojas
+
+    with pd.ExcelWriter(ruta, engine="xlsxwriter") as writer:
+        indice.to_excel(writer, sheet_name="Indice", index=False)
+        for agente, hoja in zip(indice["agent"], hojas):
+            detalle_agente(grupos[agente]).to_excel(writer, sheet_name=hoja, index=False)
+    return indice
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera estados de comisiones FTD por agente para un mes.")
+    parser.add_argument("mes", type=mes_valido, help="Mes a procesar en formato YYYY-MM (ej. 2025-10)")
+    parser.add_argument("--modo", choices=["agentes", "libro"], default="agentes",
+                        help="agentes: un .xlsx por agente; libro: un solo .xlsx con una hoja por agente")
+    parser.add_argument("--salida", default="estados_comisiones", help="Carpeta de salida")
+    parser.add_argument("--csv", default=None,
+                        help=f"Leer de un CSV en lugar de Railway (ej. {CSV_RESPALDO})")
+    parser.add_argument("--workers", type=entero_positivo, default=None, help="Procesos del pool (por defecto: CPUs)")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    os.makedirs(args.salida, exist_ok=True)
+
+    df = pd.read_csv(args.csv, dtype=str) if args.csv else cargar_datos()
+    df = preparar_ftd(df)
+    dff, indice = calcular_estados(df, args.mes)
+    print(f"📊 {args.mes}: {len(indice)} agentes, {len(dff)} FTDs ({time.perf_counter() - inicio:.2f}s)")
+
+    if indice.empty:
+        print("❌ Sin FTDs para el mes indicado.")
+        return
+
+    if args.modo == "agentes":
+        indice = escribir_por_agente(dff, indice, args.mes, args.salida, args.workers)
+    else:
+        indice = escribir_libro_unico(dff, indice, args.mes, args.salida)
+
+    ruta_indice = os.path.join(args.salida, f"indice_comisiones_{args.mes}.csv")
+    indice.to_csv(ruta_indice, index=False, encoding="utf-8-sig")
+    print(f"💾 Índice guardado: {ruta_indice}")
+    print(f"✅ Estados generados en {args.salida} ({time.perf_counter() - inicio:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()